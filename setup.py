@@ -8,4 +8,5 @@ setup(
     author='Brixt18',
     license='MIT',
     install_requires=['flask', "flask-sqlalchemy"],
+    extras_require={"argon2": ["argon2-cffi"]},
 )
@@ -1,6 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+# defaults valid for every pool class, override or extend them with `app.config["SQLALCHEMY_ENGINE_OPTIONS"]`
+ENGINE_OPTIONS = {
+    "pool_pre_ping": True,  # test connections on checkout instead of failing on stale ones
+    "pool_recycle": 3600,  # replace connections older than an hour
+}
+
+db = SQLAlchemy(engine_options=ENGINE_OPTIONS)
 
 MODEL = db.Model
 COLUMN = db.Column
@@ -1,21 +1,114 @@
 import logging
-import secrets
+import os
+import re
+from collections import OrderedDict
 from datetime import UTC, datetime
-from typing import Any, TypeVar, Union, Self
+from itertools import islice
+from typing import Any, Iterable, Iterator, TypeVar, Union, Self
 
-from flask import abort
+from flask import abort, g
 from flask_sqlalchemy.query import Query
+from sqlalchemy import Select, UniqueConstraint, bindparam, func, inspect, select
+from sqlalchemy import update as update_query
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.compiler import InsertmanyvaluesSentinelOpts
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from .const import *
 
+try:
+    from flask_login import current_user
+
+    HAS_FLASK_LOGIN = True
+
+except ImportError:
+    current_user = None
+    HAS_FLASK_LOGIN = False
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+
+    password_hasher = PasswordHasher()
+    HAS_ARGON2 = True
+
+except ImportError:
+    password_hasher = None
+    HAS_ARGON2 = False
+
 T = TypeVar("T")
 
+SAVE_ATTEMPTS = 3  # attempts to save an object with a new token when the generated one already exists
+MAX_PASSWORD_LENGTH = 1024  # longer passwords are refused by `make_password_hash` and rejected by `check_password` without hashing them
+ARGON2_HASH_PREFIX = "$argon2"  # prefix of the hashes generated by `argon2`
+CACHE_KEY = "_flask_models_cache"  # attribute of `flask.g` holding the lookups cache of the current request
+CACHE_SIZE = 128  # maximum number of records kept in the lookups cache, the least recently used are discarded first
+
 
 def get_current_timezone(tz=UTC):
     return datetime.now(tz=UTC)
 
 
+def make_password_hash(password: str) -> str:
+    """
+    Hashes the given password with Argon2 if 'argon2-cffi' is installed, otherwise with `werkzeug.security.generate_password_hash`.
+
+    PARAMS
+    ------
+    password: str - The plain text password to hash, at most `MAX_PASSWORD_LENGTH` characters long.
+
+    RETURNS
+    -------
+    str - The hashed password.
+    """
+    if len(password) > MAX_PASSWORD_LENGTH:
+        raise ValueError(f"The password must be at most {MAX_PASSWORD_LENGTH} characters long, got {len(password)}.")
+
+    if HAS_ARGON2:
+        return password_hasher.hash(password)
+
+    return generate_password_hash(password)
+
+
+def chunked(iterable: Iterable[T], n: int) -> Iterator[list[T]]:
+    """
+    Split the given iterable in lists of at most `n` elements.
+
+    PARAMS
+    ------
+    iterable: Iterable - The elements to split.
+    n: int - The maximum length of each chunk.
+
+    RETURNS
+    -------
+    Iterator[list] - The chunks, in the same order of the iterable.
+    """
+    iterator = iter(iterable)
+
+    while chunk := list(islice(iterator, n)):
+        yield chunk
+
+
+def generate_tokens(n: int, length: int = 15) -> list[str]:
+    """
+    Generates `n` random tokens from a single `os.urandom` call.
+
+    PARAMS
+    ------
+    n: int - The number of tokens to generate.
+    length: int - The length, in bytes, of each token. Default is 15.
+
+    RETURNS
+    -------
+    list[str] - The generated tokens, hex encoded.
+    """
+    raw = os.urandom(length * n)
+
+    return [raw[i:i + length].hex() for i in range(0, length * n, length)]
+
+
 class CRUD:
     __abstract__ = True
 
@@ -32,41 +125,199 @@ class CRUD:
         -------
         bool - False if the user is not authenticated and check_auth is True, True otherwise.
         """
-        if check_auth:
-            try:
-                from flask_login import current_user
+        if not check_auth:
+            return True
 
-                if not current_user.is_authenticated:
-                    logging.info("Authentication validation 'check_auth' failed: user is not authenticated.")  # noqa
-                    return False
+        if not HAS_FLASK_LOGIN:
+            logging.warning("Could not import 'flask_login'. 'check_auth' will be True.")  # noqa
+            return True
 
-            except ImportError:
-                logging.warning("Could not import 'flask_login'. 'check_auth' will be True.")  # noqa
+        if not current_user.is_authenticated:
+            logging.info("Authentication validation 'check_auth' failed: user is not authenticated.")  # noqa
+            return False
 
         return True
 
-    def _exist_token(self, token: str) -> bool:
+    @classmethod
+    def _column_names(cls) -> frozenset:
+        """
+        Get the names of the column attributes of the class's model. They are computed once and cached in the class.
+
+        RETURNS
+        -------
+        frozenset - The names of the mapped column attributes.
         """
-        Check if the given token already exists in the database
+        names = cls.__dict__.get("_cached_column_names")
+
+        if names is None:
+            names = frozenset(cls.__mapper__.column_attrs.keys())
+            cls._cached_column_names = names
+
+        return names
+
+    @classmethod
+    def _token_stmt(cls) -> Select:
+        """
+        Get the statement selecting a record of the class's model by its token, bound to the `token` parameter. It is built once and cached in the class, so its compiled form is reused by the engine.
+
+        RETURNS
+        -------
+        Select - The statement selecting the record.
+        """
+        stmt = cls.__dict__.get("_cached_token_stmt")
+
+        if stmt is None:
+            stmt = select(cls).where(cls.token == bindparam("token"))
+            cls._cached_token_stmt = stmt
+
+        return stmt
+
+    @staticmethod
+    def _get_cache() -> OrderedDict:
+        """
+        Get the lookups cache of the current request, stored in `flask.g` so it is discarded with the application context.
+
+        RETURNS
+        -------
+        OrderedDict - The cache, keyed by `(class, field, value)` and ordered from the least to the most recently used.
+        """
+        return g.setdefault(CACHE_KEY, OrderedDict())
+
+    @classmethod
+    def _cache_get(cls, key: tuple) -> Any:
+        """
+        Get a record from the lookups cache of the current request, marking it as the most recently used.
 
         PARAMS
         ------
-        token: str - token to check if exists
+        key: tuple - The key of the record, `(class, field, value)`.
 
         RETURNS
         -------
-        bool - True if the token already exists in the database, False otherwise.
+        object | None - The cached record, or None if it is not cached.
+        """
+        cache = cls._get_cache()
+        query = cache.get(key)
+
+        if query is not None:
+            cache.move_to_end(key)
+
+        return query
+
+    @classmethod
+    def _cache_set(cls, key: tuple, query: Any) -> None:
         """
-        query = self.get_by_token(token)
+        Store a record in the lookups cache of the current request, discarding the least recently used one if the cache is full (see `CACHE_SIZE`).
 
-        if (query is None) or (query.id == self.id):
+        PARAMS
+        ------
+        key: tuple - The key of the record, `(class, field, value)`.
+        query: object - The record to cache.
+
+        RETURNS
+        -------
+        None - The method does not return any value.
+        """
+        cache = cls._get_cache()
+        cache[key] = query
+
+        if len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def _clear_cache() -> None:
+        """
+        Discard the lookups cache of the current request. Needed when the session is closed, as the cached objects get detached.
+
+        RETURNS
+        -------
+        None - The method does not return any value.
+        """
+        g.pop(CACHE_KEY, None)
+
+    def _uncache(self) -> None:
+        """
+        Remove the current object from the lookups cache of the current request.
+
+        RETURNS
+        -------
+        None - The method does not return any value.
+        """
+        cache = self._get_cache()
+        cache.pop((self.__class__, "id", self.id), None)
+        cache.pop((self.__class__, "token", self.token), None)
+
+    @classmethod
+    def _token_constraint_names(cls) -> frozenset:
+        """
+        Get the names the database may give to the unique constraint of the 'token' field in its errors: the names of the unique constraints and indexes on that field alone, and the default ones (`<table>.token` on SQLite and MySQL, `<table>_token_key` on PostgreSQL). They are computed once and cached in the class.
+
+        RETURNS
+        -------
+        frozenset - The names of the unique constraint of the 'token' field.
+        """
+        names = cls.__dict__.get("_cached_token_constraint_names")
+
+        if names is None:
+            table = cls.__table__
+            unique = [c for c in table.constraints if isinstance(c, UniqueConstraint)] + [i for i in table.indexes if i.unique]
+
+            names = {f"{table.name}.token", f"{table.name}_token_key"}
+            names.update(c.name for c in unique if (isinstance(c.name, str)) and (list(c.columns.keys()) == ["token"]))
+
+            names = frozenset(names)
+            cls._cached_token_constraint_names = names
+
+        return names
+
+    @classmethod
+    def _is_token_collision(cls, error: IntegrityError) -> bool:
+        """
+        Check if the given error was raised by the unique constraint of the 'token' field, by matching the names of that constraint as whole identifiers in the error, so other fields like 'refresh_token' do not match.
+
+        PARAMS
+        ------
+        error: IntegrityError - The error raised when committing.
+
+        RETURNS
+        -------
+        bool - True if the error names the unique constraint of the 'token' field, False otherwise.
+        """
+        names = cls._token_constraint_names()
+
+        # PostgreSQL drivers report the violated constraint
+        constraint_name = getattr(getattr(error.orig, "diag", None), "constraint_name", None)
+
+        if constraint_name is not None:
+            return constraint_name in names
+
+        message = str(error.orig)
+
+        # MySQL names the key after the column, quoted
+        if "for key 'token'" in message:
+            return True
+
+        return any(re.search(rf"(?<![\w.]){re.escape(name)}(?![\w.])", message) for name in names)
+
+    def _password_changed(self) -> bool:
+        """
+        Check if the password of the current object was set or changed and is pending to be hashed. A password already hashed by `save` is not hashed again, even if the save failed.
+
+        RETURNS
+        -------
+        bool - True if the object is new or its password changed since it was loaded, False otherwise.
+        """
+        if (not isinstance(self.password, str)) or (self.password == self.__dict__.get("_hashed_password")):
             return False
 
-        return True
+        state = inspect(self)
+
+        return (not state.has_identity) or (state.attrs.password.history.has_changes())
 
     def generate_token(self, length: int = 15) -> str:
         """
         Generates a token for the current object, if the object does not have one already. It is assumed that the 'token' field is unique in the database.
+        The database is not queried: collisions are detected by the unique constraint when saving (see `save`).
 
         PARAMS
         ------
@@ -77,40 +328,61 @@ class CRUD:
         str - The generated token.
         """
         if not self.token:
-            self.token = secrets.token_hex(length)
-
-        while self._exist_token(self.token):
-            self.token = secrets.token_hex(length)
+            self.token = os.urandom(length).hex()
 
         return self.token
 
-    def save(self, check_auth: bool = True, generate_token: bool = True, hash_password: bool = True, close_session_after: bool = False) -> Self:
+    def save(self, check_auth: bool = True, generate_token: bool = True, hash_password: bool = True, close_session_after: bool = False, nested: bool = False) -> Self:
         """
         Save the current object to the database.
 
         PARAMS
         ------
         check_auth: bool - Indicates whether the current user's authentication status should be checked before saving the object. Default is True.
-        generate_token: bool - Indicates whether a token should be generated for each object before saving. Default is True.
-        hash_password: bool - Indicates whether the password should be hashed before saving the object, if the model has the attribute "password" otherwise will be ignored. Default is True.
+        generate_token: bool - Indicates whether a token should be generated for the object before saving. If the object is new and the generated token already exists in the database, a new one is generated and the save is retried. Default is True.
+        hash_password: bool - Indicates whether the password should be hashed before saving the object, if the model has the attribute "password" otherwise will be ignored. Only new or changed passwords are hashed, so re-saving the object does not hash them again. Passwords longer than `MAX_PASSWORD_LENGTH` raise a ValueError, as `check_password` would never match them. Default is True.
+        nested: bool - Indicates whether a checkpoint (SAVEPOINT) should be created before saving the object. Default is False.
 
         RETURNS
         -------
         self - The current object itself.
         """
         if self._check_auth(check_auth):
-            db.session.begin_nested()  # create checkpoint
-            db.session.add(self)
+            self._uncache()
+
+            # hash before opening the transaction, hashing is slow on purpose
+            if (hash_password) and ("password" in self._column_names()) and (self._password_changed()):
+                self.password = make_password_hash(self.password)
+                self._hashed_password = self.password
+
+            if nested:
+                db.session.begin_nested()  # create checkpoint
+
+            # objects already tracked by the session are flushed without adding them again
+            if self not in db.session:
+                db.session.add(self)
+
+            # only new objects with a generated token can be retried with another token
+            retry_token = (generate_token) and (not self.token) and (not inspect(self).persistent)
 
             if generate_token:
                 self.generate_token()
 
-            if (hash_password) and (hasattr(self, "password")) and (isinstance(self.password, str)):
-                self.password = generate_password_hash(self.password)
-
-            # commit
+            # commit, retrying with a new token if it already exists
             try:
-                db.session.commit()
+                for attempt in range(SAVE_ATTEMPTS):
+                    try:
+                        db.session.commit()
+                        break
+
+                    except IntegrityError as e:
+                        if (not retry_token) or (not self._is_token_collision(e)) or (attempt == SAVE_ATTEMPTS - 1):
+                            raise
+
+                        db.session.rollback()
+                        self.token = None
+                        self.generate_token()
+                        db.session.add(self)
 
             except Exception as e:
                 logging.exception(e)
@@ -119,10 +391,11 @@ class CRUD:
             finally:
                 if close_session_after:
                     db.session.close()
+                    self._clear_cache()
 
         return self
 
-    def delete(self, soft: bool = True, check_auth: bool = True, close_session_after: bool = False) -> None:
+    def delete(self, soft: bool = True, check_auth: bool = True, close_session_after: bool = False, nested: bool = False) -> None:
         """
         Delete the current object from the database.
 
@@ -132,13 +405,18 @@ class CRUD:
         soft: bool, optional
                 If True, performs a soft delete by marking the object as inactive instead of physically removing it from the database. For soft-deletes it is necessary to set `self.is_active` field (included in the `Model`).
                 If False, performs a hard delete by permanently removing the object from the database. Default is True.
+        nested: bool - Indicates whether a checkpoint (SAVEPOINT) should be created before deleting the object. Default is False.
 
         RETURNS
         -------
         None - The method does not return any value.
         """
         if self._check_auth(check_auth):
-            db.session.begin_nested()
+            self._uncache()
+
+            if nested:
+                db.session.begin_nested()
+
             try:
                 if soft:
                     self.update({"is_active": False})
@@ -155,36 +433,85 @@ class CRUD:
             finally:
                 if close_session_after:
                     db.session.close()
+                    self._clear_cache()
 
-    def update(self, data: dict, check_auth: bool = True, close_session_after: bool = False) -> Self:
+    @classmethod
+    def _primary_key_names(cls) -> frozenset:
+        """
+        Get the names of the attributes mapped to the primary key of the class's model.
+
+        RETURNS
+        -------
+        frozenset - The names of the primary key attributes.
+        """
+        mapper = cls.__mapper__
+
+        return frozenset(mapper.get_property_by_column(column).key for column in mapper.primary_key)
+
+    @classmethod
+    def _updates_by_statement(cls) -> bool:
+        """
+        Check if the records of the class's model can be updated by a single `UPDATE` statement, which skips the ORM flush: only if the model has no validators (`@validates`), no `before_update`/`after_update` mapper listeners and no version column (`version_id_col`).
+
+        RETURNS
+        -------
+        bool - True if the records can be updated by statement, False if the attributes must be assigned and flushed.
+        """
+        mapper = cls.__mapper__
+
+        return (not mapper.validators) and (not mapper.dispatch.before_update) and (not mapper.dispatch.after_update) and (mapper.version_id_col is None)
+
+    def update(self, data: dict, check_auth: bool = True, close_session_after: bool = False, nested: bool = False) -> Self:
         """
         Update the current object with the given data.
+        If the object is already in the database and its model has no hooks (see `_updates_by_statement`), and the primary key is not changed, it is updated with a single `UPDATE` statement, so other objects of the session holding the same record are not refreshed. Otherwise the attributes are assigned and flushed as usual.
 
         PARAMS
         ------
-        data: dict - A dictionary containing the data to update the current object with.
+        data: dict - A dictionary containing the data to update the current object with. Only the keys matching a column of the model are updated.
         check_auth: bool - Indicates whether the current user's authentication status should be checked before updating the object. Default is True.
+        nested: bool - Indicates whether a checkpoint (SAVEPOINT) should be created before updating the object. Default is False.
 
         RETURNS
         -------
         self - The current object itself.
         """
         if self._check_auth(check_auth):
-            db.session.begin_nested()
+            self._uncache()
+
+            if nested:
+                db.session.begin_nested()
+
             try:
-                for key, value in data.items():
-                    if hasattr(self, key):
-                        setattr(self, key, value)
-                    
-                    else:
-                        logging.warning(f"Not updating attribute '{key}', does not exist for '{repr(self)}'.")
+                columns = self._column_names()
+                values = {key: data[key] for key in columns & data.keys()}
+
+                for key in data.keys() - columns:
+                    logging.warning(f"Not updating attribute '{key}', does not exist for '{repr(self)}'.")
+
+                if "updated_at" in columns:
+                    values["updated_at"] = get_current_timezone()
 
-                if hasattr(self, "updated_at"):
-                    self.updated_at = get_current_timezone()
-                
                 else:
                     logging.warning(f"No updating 'updated_at', does not exist for '{repr(self)}'.")
 
+                cls = self.__class__
+
+                # records already in the database are updated by a single statement, unless the model has hooks that must run on flush
+                # or the primary key changes (the identity map must follow the new key)
+                if (inspect(self).persistent) and (cls._updates_by_statement()) and (values.keys().isdisjoint(cls._primary_key_names())):
+                    if values:
+                        stmt = update_query(cls).where(cls.id == self.id).values(values)
+                        db.session.execute(stmt, execution_options={"synchronize_session": False})
+
+                        # only this object is synchronized, instead of scanning the whole session
+                        for key, value in values.items():
+                            set_committed_value(self, key, value)
+
+                else:
+                    for key, value in values.items():
+                        setattr(self, key, value)
+
                 db.session.commit()
 
             except Exception as e:
@@ -194,67 +521,211 @@ class CRUD:
             finally:
                 if close_session_after:
                     db.session.close()
+                    self._clear_cache()
         return self
 
     def check_password(self, password: str) -> bool:
         """
-        Check if the provided password matches the hashed password of the current object.
+        Check if the provided password matches the hashed password of the current object. Argon2 hashes are checked with 'argon2-cffi', the others (`werkzeug.security`) with `check_password_hash`.
 
         PARAMS
         ------
-        password: str - The plain text password to check.
+        password: str - The plain text password to check. Empty passwords, or longer than `MAX_PASSWORD_LENGTH`, never match.
 
         RETURNS
         -------
         bool - Returns True if the provided password matches the hashed password of the current object, False otherwise.
         """
-        return check_password_hash(self.password, password)
+        if (not password) or (len(password) > MAX_PASSWORD_LENGTH):
+            return False
+
+        if not self.password.startswith(ARGON2_HASH_PREFIX):
+            return check_password_hash(self.password, password)
+
+        if not HAS_ARGON2:
+            logging.warning(f"Could not import 'argon2'. Can not check the Argon2 password of '{repr(self)}'.")  # noqa
+            return False
+
+        try:
+            return password_hasher.verify(self.password, password)
+
+        except (VerificationError, InvalidHashError):
+            return False
+
+    @staticmethod
+    def _as_mapping(obj) -> dict:
+        """
+        Build the dictionary of column values of the given object, as expected by `bulk_insert_mappings`. Only the attributes that were set on the object are included, so the columns defaults still apply.
+
+        PARAMS
+        ------
+        obj: Model - The object to convert.
+
+        RETURNS
+        -------
+        dict - A dictionary with the column attributes of the object and its values.
+        """
+        state = obj.__dict__
+
+        return {key: state[key] for key in obj.__mapper__.column_attrs.keys() if key in state}
+
+    @classmethod
+    def _returns_ids_in_bulk(cls) -> bool:
+        """
+        Check if the database of the class's model returns the generated ids of a bulk insert in batches (`INSERT ... RETURNING` with `insertmanyvalues`), instead of one statement per row.
+
+        RETURNS
+        -------
+        bool - True if the ids are returned in batches, False otherwise.
+        """
+        dialect = db.session.get_bind(cls.__mapper__).dialect
+
+        return (dialect.insert_executemany_returning) and (dialect.insertmanyvalues_implicit_sentinel is not InsertmanyvaluesSentinelOpts.NOT_SUPPORTED)
+
+    @staticmethod
+    def _needs_unit_of_work(obj) -> bool:
+        """
+        Check if the given object must be saved through the ORM unit of work instead of `bulk_insert_mappings`: if a relationship was set on it (its foreign keys are only populated when flushing, and related objects are saved by cascade) or if it is already in the session.
+
+        PARAMS
+        ------
+        obj: Model - The object to check.
+
+        RETURNS
+        -------
+        bool - True if the object must be added to the session, False otherwise.
+        """
+        state = obj.__dict__
+
+        return (any(key in state for key in obj.__mapper__.relationships.keys())) or (obj in db.session)
 
     @classmethod
-    def bulk_save(cls, objects: list, check_auth: bool = True, generate_token: bool = True) -> None:
+    def bulk_save(cls, objects: list, check_auth: bool = True, generate_token: bool = True, batch_size: int = 1000, return_ids: bool = False) -> Union[list, None]:
         """
-        Save multiple objects to the database in a single transaction.
+        Save multiple objects to the database, committing a transaction every `batch_size` objects.
+
+        The objects are inserted with `bulk_insert_mappings`, bypassing the ORM unit of work: they are not added to the session and their `id` is not populated after saving.
+        Objects with a relationship set (e.g. `Post(author=author)`) or already in the session are saved through the unit of work instead (`add_all`), so their foreign keys and related objects are saved too.
+        If a batch fails, it is rolled back and the remaining batches are not saved; the batches already committed are kept.
 
         PARAMS
         ------
         objects: list - A list of objects to be saved.
         check_auth: bool - Indicates whether the current user's authentication status should be checked before saving the objects. Default is True.
-        generate_token: bool - Indicates whether a token should be generated for each object before saving. Default is True.
+        generate_token: bool - Indicates whether a token should be generated for each object before saving. Tokens are generated in memory, relying on the unique constraint of the 'token' field. Default is True.
+        batch_size: int - The maximum number of objects inserted per transaction, at least 1. Default is 1000.
+        return_ids: bool - Indicates whether the ids of the inserted records should be returned. They are fetched with a batched `INSERT ... RETURNING` if the database supports it (e.g. PostgreSQL), otherwise (e.g. SQLite, MySQL) with one `SELECT ... WHERE token IN (...)` per batch, or row by row for the objects without a token. Default is False.
 
         RETURNS
         -------
-        None - The method does not return any value.
+        list | None - The ids of the saved records, in the order of `objects`, if return_ids is True. None otherwise.
         """
+        if batch_size < 1:
+            raise ValueError(f"'batch_size' must be at least 1, got {batch_size}.")
+
+        ids = [] if return_ids else None
+
         if cls._check_auth(check_auth):
-            db.session.begin_nested()
+            for chunk in chunked(objects, batch_size):
+                if generate_token:
+                    missing = [obj for obj in chunk if not obj.token]
 
-            if generate_token:
-                for obj in objects:
-                    obj.generate_token()
+                    for obj, token in zip(missing, generate_tokens(len(missing))):
+                        obj.token = token
 
-            try:
-                db.session.add_all(objects)
-                db.session.commit()
+                # None for the objects saved through the unit of work
+                mappings = [None if cls._needs_unit_of_work(obj) else cls._as_mapping(obj) for obj in chunk]
 
-            except Exception as e:
-                logging.exception(e)
-                db.session.rollback()
+                bulk = [mapping for mapping in mappings if mapping is not None]
+
+                # without batched RETURNING the ids would be fetched row by row, instead they are selected by token afterwards
+                ids_by_token = (return_ids) and (not cls._returns_ids_in_bulk()) and (all(mapping.get("token") for mapping in bulk))
+
+                try:
+                    db.session.bulk_insert_mappings(cls, bulk, return_defaults=(return_ids) and (not ids_by_token))
+                    db.session.add_all([obj for obj, mapping in zip(chunk, mappings) if mapping is None])
+                    db.session.flush()
+
+                    if ids_by_token and bulk:
+                        stmt = select(cls.token, cls.id).where(cls.token.in_([mapping["token"] for mapping in bulk]))
+                        inserted = dict(db.session.execute(stmt).all())
+
+                        for mapping in bulk:
+                            mapping["id"] = inserted[mapping["token"]]
+
+                    # read before committing, the committed objects are expired
+                    chunk_ids = [obj.id if mapping is None else mapping["id"] for obj, mapping in zip(chunk, mappings)] if return_ids else None
+
+                    db.session.commit()
+
+                except Exception as e:
+                    logging.exception(e)
+                    db.session.rollback()
+                    break
+
+                if return_ids:
+                    ids.extend(chunk_ids)
+
+        return ids
 
     @classmethod
-    def get_by_id(cls: T, id: Any, or_404: bool = False) -> Union[T, None]:
+    def bulk_update(cls, mappings: list[dict], check_auth: bool = True, batch_size: int = 1000) -> None:
         """
-        Retrieves a record from the class's model by its primary key (`db.Column(..., primary_key=True)`).
+        Update multiple records in the database, committing a transaction every `batch_size` records.
+
+        The records are updated with `bulk_update_mappings`, bypassing the ORM unit of work: the objects already loaded in the session are not refreshed.
+        If a batch fails, it is rolled back and the remaining batches are not updated; the batches already committed are kept.
+
+        PARAMS
+        ------
+        mappings: list[dict] - A list of dictionaries with the data to update, each one must include the primary key ('id') of the record. Only the keys matching a column of the model are updated.
+        check_auth: bool - Indicates whether the current user's authentication status should be checked before updating the records. Default is True.
+        batch_size: int - The maximum number of records updated per transaction, at least 1. Default is 1000.
+
+        RETURNS
+        -------
+        None - The method does not return any value.
+        """
+        if batch_size < 1:
+            raise ValueError(f"'batch_size' must be at least 1, got {batch_size}.")
+
+        if cls._check_auth(check_auth):
+            columns = cls._column_names()
+            cls._clear_cache()
+
+            for chunk in chunked(mappings, batch_size):
+                try:
+                    db.session.bulk_update_mappings(cls, [{key: mapping[key] for key in columns & mapping.keys()} for mapping in chunk])
+                    db.session.commit()
+
+                except Exception as e:
+                    logging.exception(e)
+                    db.session.rollback()
+                    break
+
+    @classmethod
+    def get_by_id(cls: T, id: Any, or_404: bool = False, cache: bool = False) -> Union[T, None]:
+        """
+        Retrieves a record from the class's model by its primary key (`db.Column(..., primary_key=True)`). If `cache` is True, found records are cached for the rest of the request.
 
         PARAMS
         ------
         id: Any - id of the record to retrieve.
         or_404: bool - Indicates whether a 404 error should be raised if the record is not found. Default is False.
+        cache: bool - Indicates whether the lookups cache of the current request should be used. The cache is not aware of changes made outside the CRUD methods (e.g. `db.session.delete()` or `db.session.close()`). Default is False.
 
         RETURNS
         -------
         object | None - The object representing the record, or None if not found and or_404 is False.
         """
-        query = cls.query.get(id)
+        key = (cls, "id", id)
+        query = cls._cache_get(key) if cache else None
+
+        if query is None:
+            query = db.session.get(cls, id)
+
+            if (query is not None) and (cache):
+                cls._cache_set(key, query)
 
         if (not query) and (or_404):
             abort(404)
@@ -262,20 +733,28 @@ class CRUD:
         return query
 
     @classmethod
-    def get_by_token(cls: T, token: str, or_404: bool = False) -> Union[T, None]:
+    def get_by_token(cls: T, token: str, or_404: bool = False, cache: bool = False) -> Union[T, None]:
         """
-        Retrieves a record from the class's model by its token. It is assumed that the 'token' field is unique in the database.
+        Retrieves a record from the class's model by its token. It is assumed that the 'token' field is unique in the database. If `cache` is True, found records are cached for the rest of the request.
 
         PARAMS
         ------
         token: str - Token of the record to retrieve.
         or_404: bool - Indicates whether a 404 error should be raised if the record is not found. Default is False.
+        cache: bool - Indicates whether the lookups cache of the current request should be used. The cache is not aware of changes made outside the CRUD methods (e.g. `db.session.delete()` or `db.session.close()`). Default is False.
 
         RETURNS
         -------
         object | None - The object representing the record, or None if not found and or_404 is False.
         """
-        query = cls.query.filter_by(token=token).first()
+        key = (cls, "token", token)
+        query = cls._cache_get(key) if cache else None
+
+        if query is None:
+            query = db.session.execute(cls._token_stmt(), {"token": token}).scalar_one_or_none()
+
+            if (query is not None) and (cache):
+                cls._cache_set(key, query)
 
         if (not query) and (or_404):
             abort(404)
@@ -283,7 +762,7 @@ class CRUD:
         return query
 
     @classmethod
-    def get_all(cls: T, limit: int = None, basequery: bool = False) -> Union[list[T], Query]:
+    def get_all(cls: T, limit: int = None, basequery: bool = False, eager: list[str] = None, keyset: bool = False, after_id: Any = None, stream: bool = False, yield_per: int = 1000) -> Union[list[T], Query]:
         """
         Retrieves all the records from the class's model, applying an optional limit and returning either the query or the query results.
 
@@ -291,12 +770,31 @@ class CRUD:
         ------
         limit: int - Maximum number of records to be returned. If not provided, no limit will be applied.
         basequery: bool - Indicates whether the query object should be returned or the query results. Default is False.
+        eager: list[str] - Names of the relationships to load along with the records, with one extra query per relationship (`selectinload`) instead of one per record. If not provided, relationships are loaded lazily.
+        keyset: bool - Indicates whether the records should be ordered by id, for keyset pagination: get the first page with `keyset=True` and the next ones with `after_id`. Default is False.
+        after_id: Any - If provided, only the records with an id greater than it are retrieved, ordered by id (pass the id of the last record of the previous page). Implies `keyset`.
+        stream: bool - Indicates whether the records should be fetched from the database in chunks of `yield_per` records while iterating the returned query, instead of loading all of them in memory. Default is False.
+        yield_per: int - The number of records fetched per chunk when streaming. Default is 1000.
 
         RETURNS
         -------
-        list | Query - A list of the query results or the query object, depending on the value of the "basequery" parameter.
+        list | Query - A list of the query results or the query object, depending on the value of the "basequery" and "stream" parameters.
         """
-        query = cls.query.limit(limit)
+        query = cls.query
+
+        if eager:
+            query = query.options(*[selectinload(getattr(cls, relationship)) for relationship in eager])
+
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+
+        if (keyset) or (after_id is not None):
+            query = query.order_by(cls.id)
+
+        query = query.limit(limit)
+
+        if stream:
+            return query.yield_per(yield_per)
 
         return query if basequery else query.all()
 
@@ -307,12 +805,12 @@ class Model(db.Model, CRUD):
     id = COLUMN(INTEGER, primary_key=True, autoincrement=True, nullable=False)
     token = COLUMN(STRING(32), unique=True, nullable=False)
 
-    created_at = COLUMN(DATETIME, nullable=False, default=get_current_timezone)
-    updated_at = COLUMN(DATETIME, nullable=False,default=get_current_timezone, onupdate=get_current_timezone)  # noqa
+    created_at = COLUMN(DATETIME, nullable=False, default=get_current_timezone, server_default=func.now())
+    updated_at = COLUMN(DATETIME, nullable=False, default=get_current_timezone, server_default=func.now(), onupdate=get_current_timezone)  # noqa
     is_active = COLUMN(BOOLEAN, nullable=False, default=True)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     def __repr__(self):
-        return '<{}>'.format(self.__class__.__name__)
+        return f"<{type(self).__name__}>"